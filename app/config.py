@@ -11,6 +11,7 @@ class Settings(BaseSettings):
     debug: bool = False
 
     database_path: Path = Path("./data/minecraft_api.sqlite3")
+    database_pool_size: int = 5
 
     data_dir: Path = Path("./data/minecraft")
     decompiler_jar: Path = Path("./MinecraftDecompiler.jar")
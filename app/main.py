@@ -1,58 +1,103 @@
-from blacksheep import Application, json, Response
-from blacksheep.server.routing import Router
+from blacksheep import Application, Content, Response
 from blacksheep.server.responses import text
+import asyncio
+import logging
 import time
+import orjson
+from typing import Optional
 from app.config import settings
 from app.services.database import db
 from app.services.cache import cache
 from app.services.search_service import search_service
 from app.models.schemas import APIHealth
+from app.utils.responses import raw_json_response
 
-from app.routes.versions import router as versions_router
-from app.routes.files import router as files_router
-from app.routes.search import router as search_router
+from app.routes import router as api_router
+from app.routes import files, search, versions  # noqa: F401 - registers the API routes
 
-api_router = Router(sub_routers=[versions_router, files_router, search_router])
 app = Application(router=api_router)
 
+logging.basicConfig(level=logging.INFO if settings.debug else logging.WARNING)
+logger = logging.getLogger("msrcapi")
+
+HEALTH_TTL = 5.0
+VERSION_COUNT_TTL = 30.0
+
+# (checked_at, status_code, body); probes inside the TTL share one result
+_health_cache: Optional[tuple[float, int, bytes]] = None
+_health_lock = asyncio.Lock()
+
+_version_count_cache: Optional[tuple[float, int]] = None
+_version_count_lock = asyncio.Lock()
+
+METRICS_TEMPLATE = """# HELP minecraft_api_cache_hit_rate Cache hit rate
+# TYPE minecraft_api_cache_hit_rate gauge
+minecraft_api_cache_hit_rate {cache_hit_rate}
+
+# HELP minecraft_api_version_count Total decompiled versions
+# TYPE minecraft_api_version_count gauge
+minecraft_api_version_count {version_count}
+
+# HELP minecraft_api_cache_hits Total cache hits
+# TYPE minecraft_api_cache_hits counter
+minecraft_api_cache_hits {cache_hits}
+
+# HELP minecraft_api_cache_misses Total cache misses
+# TYPE minecraft_api_cache_misses counter
+minecraft_api_cache_misses {cache_misses}
+"""
 
-@app.on_start
-async def on_start(application: Application) -> None:
 
+async def _init_db() -> None:
     try:
         await db.connect()
         await db.init_schema()
-        print("✓ Database connected")
-    except Exception as e:
-        print(f"✗ Database connection failed: {e}")
+        logger.info("Database connected")
+    except Exception:
+        logger.exception("Database connection failed")
 
+
+async def _init_cache() -> None:
     try:
         await cache.connect()
-        print("✓ Cache initialized")
-    except Exception as e:
-        print(f"✗ Cache initialization failed: {e}")
+        logger.info("Cache initialized")
+    except Exception:
+        logger.exception("Cache initialization failed")
+
 
+async def _init_search() -> None:
     try:
         await search_service.connect()
         await search_service.init_index()
-        print("✓ Search service ready")
-    except Exception as e:
-        print(f"✗ Search service initialization failed: {e}")
+        logger.info("Search service ready")
+    except Exception:
+        logger.exception("Search service initialization failed")
 
-    print(f"API running at http://{settings.api_host}:{settings.api_port}")
+
+async def _init_db_and_search() -> None:
+    # the search index is built from the decompiled versions recorded in the db
+    await _init_db()
+    await _init_search()
+
+
+@app.on_start
+async def on_start(application: Application) -> None:
+    await asyncio.gather(_init_db_and_search(), _init_cache())
+
+    logger.info("API running at http://%s:%s", settings.api_host, settings.api_port)
 
 
 @app.on_stop
 async def on_stop(application: Application) -> None:
-    print("Shutting down...")
+    logger.info("Shutting down...")
     await db.disconnect()
     await cache.disconnect()
-    print("Bye!")
+    logger.info("Bye!")
 
 
-@app.router.get("/")
-async def index():
-    return json(
+INDEX_CONTENT = Content(
+    b"application/json",
+    orjson.dumps(
         {
             "name": "Minecraft Source API",
             "version": "1.0.0",
@@ -67,11 +112,16 @@ async def index():
                 "health": "/health",
             },
         }
-    )
+    ),
+)
 
 
-@app.router.get("/health")
-async def health():
+@app.router.get("/")
+async def index():
+    return Response(200, content=INDEX_CONTENT)
+
+
+async def _check_health() -> tuple[int, bytes]:
     db_connected = await db.is_connected()
     cache_ready = await cache.is_connected()
     search_ready = await search_service.is_connected()
@@ -95,31 +145,50 @@ async def health():
     )
 
     status_code = 200 if health_status.status == "healthy" else 503
-    return json(health_status.model_dump(), status=status_code)
+    return status_code, health_status.model_dump_json().encode()
 
 
-@app.router.get("/metrics")
-async def metrics():
-    cache_hit_rate = cache.get_hit_rate()
-    version_count = await db.get_version_count() if await db.is_connected() else 0
+@app.router.get("/health")
+async def health():
+    global _health_cache
 
-    metrics_text = f"""# HELP minecraft_api_cache_hit_rate Cache hit rate
-# TYPE minecraft_api_cache_hit_rate gauge
-minecraft_api_cache_hit_rate {cache_hit_rate}
+    cached = _health_cache
+    if cached is None or time.monotonic() - cached[0] >= HEALTH_TTL:
+        async with _health_lock:
+            cached = _health_cache
+            if cached is None or time.monotonic() - cached[0] >= HEALTH_TTL:
+                status_code, body = await _check_health()
+                cached = _health_cache = (time.monotonic(), status_code, body)
 
-# HELP minecraft_api_version_count Total decompiled versions
-# TYPE minecraft_api_version_count gauge
-minecraft_api_version_count {version_count}
+    _, status_code, body = cached
+    return raw_json_response(body, status_code)
 
-# HELP minecraft_api_cache_hits Total cache hits
-# TYPE minecraft_api_cache_hits counter
-minecraft_api_cache_hits {cache.hits}
 
-# HELP minecraft_api_cache_misses Total cache misses
-# TYPE minecraft_api_cache_misses counter
-minecraft_api_cache_misses {cache.misses}
-"""
-    return text(metrics_text, headers={"Content-Type": "text/plain; charset=utf-8"})
+async def _get_version_count() -> int:
+    global _version_count_cache
+
+    cached = _version_count_cache
+    if cached is None or time.monotonic() - cached[0] >= VERSION_COUNT_TTL:
+        async with _version_count_lock:
+            cached = _version_count_cache
+            if cached is None or time.monotonic() - cached[0] >= VERSION_COUNT_TTL:
+                count = await db.get_version_count() if await db.is_connected() else 0
+                cached = _version_count_cache = (time.monotonic(), count)
+
+    return cached[1]
+
+
+@app.router.get("/metrics")
+async def metrics():
+    metrics_text = METRICS_TEMPLATE.format_map(
+        {
+            "cache_hit_rate": cache.get_hit_rate(),
+            "version_count": await _get_version_count(),
+            "cache_hits": cache.hits,
+            "cache_misses": cache.misses,
+        }
+    )
+    return text(metrics_text)
 
 
 
@@ -135,9 +204,15 @@ def configure_middlewares(app: Application):
 
     allowed_origins = settings.cors_allow_origins
     allow_all_origins = "*" in allowed_origins
+    # compared against the raw header bytes, so no per-request decode or list scan
+    allowed_origin_set = frozenset(origin.encode() for origin in allowed_origins)
+    default_origin = b"*" if allow_all_origins else allowed_origins[0].encode()
     allowed_methods = ", ".join(settings.cors_allow_methods).encode()
     allowed_headers = ", ".join(settings.cors_allow_headers).encode()
     max_age = str(settings.cors_max_age).encode()
+    allow_credentials = settings.cors_allow_credentials
+    origin_not_allowed = Content(b"application/json", b'{"error":"Origin not allowed"}')
+    internal_error = Content(b"application/json", b'{"error":"Internal server error"}')
 
     def add_cors_headers(response: Response, origin: bytes) -> None:
         """Add CORS headers to any response"""
@@ -148,7 +223,7 @@ def configure_middlewares(app: Application):
         response.headers[b"Access-Control-Allow-Headers"] = allowed_headers
         response.headers[b"Access-Control-Expose-Headers"] = allowed_headers
         response.headers[b"Access-Control-Max-Age"] = max_age
-        if settings.cors_allow_credentials and origin != b"*":
+        if allow_credentials and origin != b"*":
             response.headers[b"Access-Control-Allow-Credentials"] = b"true"
 
     async def cors_middleware(request: Request, handler):
@@ -157,15 +232,14 @@ def configure_middlewares(app: Application):
         if allow_all_origins:
             origin_to_use = origin_header or b"*"
         elif origin_header:
-            origin_str = origin_header.decode()
-            if origin_str in allowed_origins:
+            if origin_header in allowed_origin_set:
                 origin_to_use = origin_header
             else:
-                response = Response(403, content=json({"error": "Origin not allowed"}))
-                add_cors_headers(response, b"*")  
+                response = Response(403, content=origin_not_allowed)
+                add_cors_headers(response, b"*")
                 return response
         else:
-            origin_to_use = b"*" if allow_all_origins else allowed_origins[0].encode()
+            origin_to_use = default_origin
 
         if request.method == b"OPTIONS":
             response = Response(204)
@@ -173,9 +247,9 @@ def configure_middlewares(app: Application):
             return response
         try:
             response = await handler(request)
-        except Exception as e:
-            print(f"Error in handler: {e}")
-            response = Response(500, content=json({"error": "Internal server error"}))
+        except Exception:
+            logger.exception("Error in handler")
+            response = Response(500, content=internal_error)
 
         add_cors_headers(response, origin_to_use)
         return response
@@ -0,0 +1,5 @@
+from blacksheep import Router
+
+# every route module registers on this one router, so a request resolves through a
+# single lru-cached (method, path) lookup instead of probing each sub-router in turn
+router = Router()
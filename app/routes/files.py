@@ -1,29 +1,46 @@
-from blacksheep import Router, json, Response
-from blacksheep.server.responses import text
+from typing import Optional
+
+from blacksheep import Content, Request, Response
+from app.routes import router
+from app.services.cache import cache
 from app.services.file_service import file_service
+from app.utils.responses import etag_json_response
 
-router = Router()
+# error bodies are encoded once; a fresh Response is still built per request
+# because middlewares add headers to it
+PATH_REQUIRED_JSON = Content(b"application/json", b'{"error":"Path parameter is required"}')
+FILE_NOT_FOUND_JSON = Content(b"application/json", b'{"error":"File not found"}')
+PATH_REQUIRED_TEXT = Content(b"text/plain; charset=utf-8", b"Path parameter is required")
+FILE_NOT_FOUND_TEXT = Content(b"text/plain; charset=utf-8", b"File not found")
 
 
 @router.get("/api/v1/versions/{version}/file")
-async def get_file(version: str, path: str) -> Response:
+async def get_file(request: Request, version: str, path: str) -> Response:
     if not path:
-        return json({"error": "Path parameter is required"}, status=400)
+        return Response(400, content=PATH_REQUIRED_JSON)
+
+    # the encoded body is the only cached copy of the file for this route
+    async def load_file() -> Optional[bytes]:
+        file_content = await file_service.read_file_content(version, path)
+        return file_content.model_dump_json().encode() if file_content else None
 
-    file_content = await file_service.get_file_content(version, path)
-    if not file_content:
-        return json({"error": "File not found"}, status=404)
+    cached = await cache.get_or_compute_etag(
+        cache.cache_key_file_json(version, path), load_file, ttl=file_service.cache_ttl
+    )
+    if cached is None:
+        return Response(404, content=FILE_NOT_FOUND_JSON)
 
-    return json(file_content.model_dump())
+    return etag_json_response(request, *cached)
 
 
 @router.get("/api/v1/versions/{version}/file/raw")
 async def get_file_raw(version: str, path: str) -> Response:
     if not path:
-        return text("Path parameter is required", status=400)
+        return Response(400, content=PATH_REQUIRED_TEXT)
 
-    file_content = await file_service.get_file_content(version, path)
-    if not file_content:
-        return text("File not found", status=404)
+    # files that are not valid UTF-8 are not found, as when they were decoded per request
+    raw = await file_service.get_file_content_bytes(version, path)
+    if raw is None:
+        return Response(404, content=FILE_NOT_FOUND_TEXT)
 
-    return text(file_content.content, headers={"Content-Type": "text/plain; charset=utf-8"})
+    return Response(200, content=Content(b"text/plain; charset=utf-8", raw))
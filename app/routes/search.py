@@ -1,8 +1,21 @@
-from blacksheep import Router, json, FromJSON, Response
+from functools import lru_cache
+from typing import Optional
+
+from blacksheep import Content, FromJSON, Response
+from app.routes import router
 from app.services.search_service import search_service
 from app.models.schemas import SearchRequest
+from app.utils.responses import raw_json_response
+
+QUERY_REQUIRED_JSON = Content(b"application/json", b'{"error":"Query parameter \'q\' is required"}')
 
-router = Router()
+
+@lru_cache(maxsize=256)
+def parse_versions(versions: Optional[str]) -> Optional[tuple[str, ...]]:
+    # UIs tend to pin the same version filter, so the split is memoized per raw value
+    if not versions:
+        return None
+    return tuple(v.strip() for v in versions.split(",") if v.strip())
 
 
 @router.get("/api/v1/search")
@@ -10,19 +23,17 @@ async def search_get(
     q: str, versions: str = None, limit: int = 50, offset: int = 0
 ) -> Response:
     if not q or len(q.strip()) == 0:
-        return json({"error": "Query parameter 'q' is required"}, status=400)
-
-    version_list = None
-    if versions:
-        version_list = [v.strip() for v in versions.split(",") if v.strip()]
+        return Response(400, content=QUERY_REQUIRED_JSON)
 
-    request = SearchRequest(query=q, versions=version_list, limit=limit, offset=offset)
+    request = SearchRequest(
+        query=q, versions=parse_versions(versions), limit=limit, offset=offset
+    )
 
     result = await search_service.search(request)
-    return json(result.model_dump())
+    return raw_json_response(result.model_dump_json().encode())
 
 
 @router.post("/api/v1/search")
-async def search_post(request: FromJSON[SearchRequest]) -> Response:
-    result = await search_service.search(request.value)
-    return json(result.model_dump())
+async def search_post(data: FromJSON[SearchRequest]) -> Response:
+    result = await search_service.search(data.value)
+    return raw_json_response(result.model_dump_json().encode())
@@ -1,73 +1,95 @@
-from blacksheep import Router, json, Response
+import asyncio
+from functools import partial
+from typing import Optional
+
+import orjson
+from blacksheep import Content, Request, Response
+from pydantic import TypeAdapter
+from app.routes import router
 from app.services.database import db
 from app.services.cache import cache
 from app.services.file_service import file_service
-from app.models.schemas import VersionInfo, VersionStats, FileNode
+from app.models.schemas import VersionInfo
+from app.utils.responses import etag_json_response, orjson_response, raw_json_response
 
-router = Router()
+version_list_adapter = TypeAdapter(list[VersionInfo])
 
+VERSION_NOT_FOUND_JSON = Content(b"application/json", b'{"error":"Version not found"}')
+TREE_NOT_FOUND_JSON = Content(
+    b"application/json", b'{"error":"Version not found or not decompiled"}'
+)
 
-@router.get("/api/v1/versions")
-async def get_versions() -> Response:
-    cache_key = cache.cache_key_versions()
-    cached = await cache.get_json(cache_key)
-    if cached:
-        return json(cached)
 
-    versions = await db.get_all_versions()
-    result = [v.model_dump() for v in versions]
+async def load_version_stats(version: str) -> Optional[bytes]:
+    stats = await db.get_version_stats(version)
+    return stats.model_dump_json().encode() if stats else None
 
-    await cache.set_json(cache_key, result, ttl=300)  # 5 minutes
 
-    return json(result)
+async def warm_version_stats(version_ids: list[str]) -> None:
+    missing = [v for v in version_ids if not await cache.exists(cache.cache_key_stats(v))]
+    await asyncio.gather(
+        *(
+            cache.get_or_compute(
+                cache.cache_key_stats(v), partial(load_version_stats, v), ttl=3600
+            )
+            for v in missing
+        )
+    )
 
 
-@router.get("/api/v1/versions/{version}")
-async def get_version(version: str) -> Response:
-    cache_key = cache.cache_key_version(version)
-    cached = await cache.get_json(cache_key)
-    if cached:
-        return json(cached)
+@router.get("/api/v1/versions")
+async def get_versions(include: str = "") -> Response:
+    async def load_versions() -> bytes:
+        versions = await db.get_all_versions()
+        return version_list_adapter.dump_json(versions)
 
-    version_info = await db.get_version(version)
-    if not version_info:
-        return json({"error": "Version not found"}, status=404)
+    raw = await cache.get_or_compute(cache.cache_key_versions(), load_versions, ttl=300)
 
-    result = version_info.model_dump()
+    if "stats" in include.split(","):
+        # cache warming: the per-version stats requests that follow become cache hits
+        await warm_version_stats([v["id"] for v in orjson.loads(raw)])
 
-    await cache.set_json(cache_key, result, ttl=3600)
+    return raw_json_response(raw)
 
-    return json(result)
 
+@router.get("/api/v1/versions/{version}")
+async def get_version(version: str) -> Response:
+    async def load_version() -> Optional[bytes]:
+        version_info = await db.get_version(version)
+        return version_info.model_dump_json().encode() if version_info else None
 
-@router.get("/api/v1/versions/{version}/stats")
-async def get_version_stats(version: str) -> Response:
-    cache_key = f"stats:{version}"
-    cached = await cache.get_json(cache_key)
-    if cached:
-        return json(cached)
+    raw = await cache.get_or_compute(cache.cache_key_version(version), load_version, ttl=3600)
+    if not raw:
+        return Response(404, content=VERSION_NOT_FOUND_JSON)
 
-    stats = await db.get_version_stats(version)
-    if not stats:
-        return json({"error": "Version not found"}, status=404)
+    return raw_json_response(raw)
 
-    result = stats.model_dump()
 
-    await cache.set_json(cache_key, result, ttl=3600)
+@router.get("/api/v1/versions/{version}/stats")
+async def get_version_stats(version: str) -> Response:
+    raw = await cache.get_or_compute(
+        cache.cache_key_stats(version), partial(load_version_stats, version), ttl=3600
+    )
+    if not raw:
+        return Response(404, content=VERSION_NOT_FOUND_JSON)
 
-    return json(result)
+    return raw_json_response(raw)
 
 
 @router.get("/api/v1/versions/{version}/tree")
-async def get_file_tree(version: str) -> Response:
-    tree = await file_service.get_file_tree(version)
-    if not tree:
-        return json({"error": "Version not found or not decompiled"}, status=404)
+async def get_file_tree(request: Request, version: str) -> Response:
+    cached = await cache.get_or_compute_etag(
+        cache.cache_key_tree(version),
+        partial(file_service.get_file_tree_json, version),
+        ttl=file_service.cache_ttl,
+    )
+    if cached is None:
+        return Response(404, content=TREE_NOT_FOUND_JSON)
 
-    return json(tree.model_dump())
+    return etag_json_response(request, *cached)
 
 
 @router.get("/api/v1/versions/{version}/files")
 async def list_files(version: str, directory: str = "") -> Response:
     files = await file_service.list_files(version, directory)
-    return json({"version": version, "directory": directory, "files": files})
+    return orjson_response({"version": version, "directory": directory, "files": files})
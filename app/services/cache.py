@@ -1,84 +1,253 @@
-import copy
+import asyncio
 import fnmatch
+import hashlib
+import heapq
+import re
 import time
-from typing import Any, Dict, Optional
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import orjson
+
+from app.config import settings
+
+
+JANITOR_INTERVAL = 1.0
+
+
+def make_etag(raw: bytes) -> bytes:
+    return b'"' + hashlib.sha256(raw).hexdigest().encode() + b'"'
 
 
 class CacheEntry:
-    def __init__(self, value: Any, expires_at: Optional[float]):
+    __slots__ = ("value", "expires_at_ns", "etag")
+
+    def __init__(self, value: Any, expires_at_ns: Optional[int], etag: Optional[bytes] = None):
         self.value = value
-        self.expires_at = expires_at
+        self.expires_at_ns = expires_at_ns
+        self.etag = etag
 
 
 class CacheService:
+    __slots__ = (
+        "_store",
+        "_max_entries",
+        "_expiry_heap",
+        "_janitor_task",
+        "_inflight",
+        "hits",
+        "misses",
+        "_connected",
+    )
+
     def __init__(self):
-        self._store: Dict[str, CacheEntry] = {}
+        self._store: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._max_entries = settings.file_cache_size
+        self._expiry_heap: List[Tuple[int, str]] = []
+        self._janitor_task: Optional[asyncio.Task] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
         self.hits = 0
         self.misses = 0
         self._connected = False
 
     async def connect(self) -> None:
+        if self._janitor_task is None:
+            self._janitor_task = asyncio.create_task(self._janitor())
         self._connected = True
 
     async def disconnect(self) -> None:
+        if self._janitor_task is not None:
+            self._janitor_task.cancel()
+            try:
+                await self._janitor_task
+            except asyncio.CancelledError:
+                pass
+            self._janitor_task = None
         self._store.clear()
+        self._expiry_heap.clear()
         self._connected = False
 
     async def is_connected(self) -> bool:
         return self._connected
 
-    def _purge_expired(self) -> None:
-        now = time.time()
-        expired = [key for key, entry in self._store.items() if entry.expires_at and entry.expires_at < now]
-        for key in expired:
+    async def _janitor(self) -> None:
+        while True:
+            await asyncio.sleep(JANITOR_INTERVAL)
+            self._evict_expired(time.monotonic_ns())
+
+    def _evict_expired(self, now_ns: int) -> None:
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now_ns:
+            expires_at_ns, key = heapq.heappop(heap)
+            entry = self._store.get(key)
+            # the key may have been overwritten or deleted since this record was pushed
+            if entry is not None and entry.expires_at_ns == expires_at_ns:
+                del self._store[key]
+
+    def _get_entry(self, key: str) -> Optional[CacheEntry]:
+        entry = self._store.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at_ns is not None and entry.expires_at_ns <= time.monotonic_ns():
             del self._store[key]
+            return None
+        return entry
 
     def get_hit_rate(self) -> float:
         total = self.hits + self.misses
         return self.hits / total if total > 0 else 0.0
 
     async def get(self, key: str) -> Optional[Any]:
-        self._purge_expired()
-        entry = self._store.get(key)
-        if entry:
-            self.hits += 1
-            return entry.value
-        self.misses += 1
-        return None
+        try:
+            entry = self._store[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        expires_at_ns = entry.expires_at_ns
+        if expires_at_ns is not None and expires_at_ns <= time.monotonic_ns():
+            del self._store[key]
+            self.misses += 1
+            return None
+
+        self._store.move_to_end(key)
+        self.hits += 1
+        return entry.value
 
     async def get_json(self, key: str) -> Optional[Any]:
+        """Decode a JSON entry; every call returns a fresh object the caller may mutate."""
+        raw = await self.get_raw_json(key)
+        return orjson.loads(raw) if raw is not None else None
+
+    async def get_raw_json(self, key: str) -> Optional[bytes]:
         value = await self.get(key)
-        return copy.deepcopy(value) if value is not None else None
+        return value if isinstance(value, bytes) else None
+
+    async def get_raw_json_etag(self, key: str) -> Optional[Tuple[bytes, bytes]]:
+        raw = await self.get_raw_json(key)
+        if raw is None:
+            return None
+        return raw, self._etag_for(key, raw)
+
+    def _etag_for(self, key: str, raw: bytes) -> bytes:
+        entry = self._store.get(key)
+        if entry is not None and entry.value is raw and entry.etag is not None:
+            return entry.etag
+        return make_etag(raw)
 
     async def get_str(self, key: str) -> Optional[str]:
         value = await self.get(key)
         return value if isinstance(value, str) else None
 
-    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
-        expires_at = time.time() + ttl if ttl else None
-        self._store[key] = CacheEntry(value, expires_at)
+    async def get_bytes(self, key: str) -> Optional[bytes]:
+        value = await self.get(key)
+        return value if isinstance(value, bytes) else None
+
+    async def set(
+        self, key: str, value: Any, ttl: Optional[int] = None, etag: Optional[bytes] = None
+    ) -> None:
+        expires_at_ns = time.monotonic_ns() + ttl * 1_000_000_000 if ttl else None
+        self._store[key] = CacheEntry(value, expires_at_ns, etag)
+        self._store.move_to_end(key)
+        if expires_at_ns is not None:
+            heapq.heappush(self._expiry_heap, (expires_at_ns, key))
+        while len(self._store) > self._max_entries:
+            self._store.popitem(last=False)
+        # overwritten, evicted and deleted keys leave stale heap records behind
+        if len(self._expiry_heap) > 2 * len(self._store):
+            self._compact_expiry_heap()
+
+    def _compact_expiry_heap(self) -> None:
+        """Rebuild the heap from the live entries, keeping it bounded by the store size."""
+        heap = [
+            (entry.expires_at_ns, key)
+            for key, entry in self._store.items()
+            if entry.expires_at_ns is not None
+        ]
+        heapq.heapify(heap)
+        self._expiry_heap = heap
 
     async def set_json(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
-        await self.set(key, copy.deepcopy(value), ttl)
+        """Encode and store a JSON value; later mutation of `value` does not reach the cache."""
+        await self.set_raw_json(key, value, ttl)
+
+    async def set_raw_json(self, key: str, value: Any, ttl: Optional[int] = None) -> bytes:
+        # stored pre-encoded: bytes are immutable, so hits need no defensive copy
+        raw = value if isinstance(value, bytes) else orjson.dumps(value)
+        await self.set(key, raw, ttl, etag=make_etag(raw))
+        return raw
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: Optional[int] = None,
+    ) -> Optional[bytes]:
+        raw = await self.get_raw_json(key)
+        if raw is not None:
+            return raw
+
+        # single-flight: concurrent misses on the same key share one computation, run in a
+        # task the cache owns so a cancelled caller does not fail the others
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._compute_and_store(key, compute, ttl))
+            self._inflight[key] = task
+            task.add_done_callback(partial(self._finish_inflight, key))
+        return await asyncio.shield(task)
+
+    async def _compute_and_store(
+        self, key: str, compute: Callable[[], Awaitable[Any]], ttl: Optional[int]
+    ) -> Optional[bytes]:
+        value = await compute()
+        return await self.set_raw_json(key, value, ttl) if value is not None else None
+
+    def _finish_inflight(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved when every caller was cancelled
+
+    async def get_or_compute_etag(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: Optional[int] = None,
+    ) -> Optional[Tuple[bytes, bytes]]:
+        raw = await self.get_or_compute(key, compute, ttl)
+        if raw is None:
+            return None
+        return raw, self._etag_for(key, raw)
 
     async def set_str(self, key: str, value: str, ttl: Optional[int] = None) -> None:
         await self.set(key, value, ttl)
 
+    async def set_bytes(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        await self.set(key, value, ttl)
+
     async def delete(self, key: str) -> None:
         self._store.pop(key, None)
 
     async def delete_pattern(self, pattern: str) -> None:
-        to_remove = [key for key in self._store if fnmatch.fnmatch(key, pattern)]
+        if pattern.endswith("*") and not any(c in pattern[:-1] for c in "*?["):
+            prefix = pattern[:-1]
+            to_remove = [key for key in self._store if key.startswith(prefix)]
+        else:
+            matcher = re.compile(fnmatch.translate(pattern)).match
+            to_remove = [key for key in self._store if matcher(key)]
         for key in to_remove:
             del self._store[key]
 
     async def exists(self, key: str) -> bool:
-        self._purge_expired()
-        return key in self._store
+        return self._get_entry(key) is not None
 
     def cache_key_file(self, version: str, path: str) -> str:
         return f"file:{version}:{path}"
 
+    def cache_key_file_json(self, version: str, path: str) -> str:
+        return f"file_json:{version}:{path}"
+
     def cache_key_tree(self, version: str) -> str:
         return f"tree:{version}"
 
@@ -88,5 +257,8 @@ class CacheService:
     def cache_key_version(self, version: str) -> str:
         return f"version:{version}"
 
+    def cache_key_stats(self, version: str) -> str:
+        return f"stats:{version}"
+
 
 cache = CacheService()
@@ -1,35 +1,147 @@
-import json
+import asyncio
+import logging
+from datetime import datetime
+from itertools import islice
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterable, List, Optional, Set, Tuple
 
 import aiosqlite
+import orjson
+from aiosqlitepool import SQLiteConnectionPool
 
 from app.config import settings
 from app.models.schemas import VersionInfo, VersionStats
 
+# rows per executemany call inside the single bulk-insert transaction; >=10k keeps
+# statement overhead negligible on versions with tens of thousands of files
+BULK_INSERT_BATCH_SIZE = 10_000
+
+# add_file() calls are coalesced and written by a background flusher
+PENDING_FLUSH_INTERVAL = 0.1
+PENDING_FLUSH_THRESHOLD = 5000
+
+FileRecord = Tuple[str, str, int, int]
+
+# package/class_name are derived from path by SQLite; NORMALIZED_PATH uses '/' separators
+# and FILE_DIRECTORY is its prefix up to and including the last '/'
+NORMALIZED_PATH = "replace(path, '\\', '/')"
+FILE_DIRECTORY = f"rtrim({NORMALIZED_PATH}, replace({NORMALIZED_PATH}, '/', ''))"
+IS_JAVA_FILE = "substr(path, -5) = '.java'"
+
+# characters of context kept on each side of a search match
+SNIPPET_WINDOW = 150
+
+# per-version aggregates kept on the versions row so stats reads need no join; the
+# DISTINCT subqueries walk idx_files_version_class/_package in order instead of
+# sorting into a temp b-tree as COUNT(DISTINCT ...) does
+VERSION_TOTALS_COLUMNS = ("total_classes", "total_lines", "total_packages")
+REFRESH_VERSION_TOTALS_SQL = """
+UPDATE versions SET
+    total_classes=(
+        SELECT COUNT(*) FROM (
+            SELECT DISTINCT class_name FROM files
+            WHERE version_id=versions.id AND class_name IS NOT NULL
+        )
+    ),
+    total_lines=(SELECT COALESCE(SUM(line_count), 0) FROM files WHERE version_id=versions.id),
+    total_packages=(
+        SELECT COUNT(*) FROM (
+            SELECT DISTINCT package FROM files
+            WHERE version_id=versions.id AND package IS NOT NULL
+        )
+    )
+"""
+
+FILES_TABLE_SQL = f"""
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    version_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    package TEXT GENERATED ALWAYS AS (
+        CASE WHEN {IS_JAVA_FILE} AND {FILE_DIRECTORY} != ''
+        THEN replace(rtrim({FILE_DIRECTORY}, '/'), '/', '.') END
+    ) STORED,
+    class_name TEXT GENERATED ALWAYS AS (
+        CASE WHEN {IS_JAVA_FILE}
+        THEN substr({NORMALIZED_PATH}, length({FILE_DIRECTORY}) + 1,
+                    length(path) - length({FILE_DIRECTORY}) - 5) END
+    ) STORED,
+    size_bytes INTEGER NOT NULL,
+    line_count INTEGER,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(version_id, path),
+    FOREIGN KEY(version_id) REFERENCES versions(id) ON DELETE CASCADE
+);
+"""
+
+logger = logging.getLogger("msrcapi.database")
+
 
 class DatabaseService:
     def __init__(self) -> None:
         self.db_path: Path = settings.database_path
+        self.pool_size: int = settings.database_pool_size
+        self._pool: Optional[SQLiteConnectionPool] = None
+        # every connection the factory opened; each one owns a non-daemon worker thread,
+        # so disconnect() closes any the pool did not
+        self._open_connections: Set[aiosqlite.Connection] = set()
+        self._pending: List[FileRecord] = []
+        self._pending_lock = asyncio.Lock()
+        self._pending_full = asyncio.Event()
+        self._flusher_task: Optional[asyncio.Task] = None
         self._connected: bool = False
 
-    async def connect(self) -> None:
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        async with aiosqlite.connect(self.db_path) as conn:
+    async def _make_connection(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.db_path)
+        self._open_connections.add(conn)
+        try:
+            conn.row_factory = aiosqlite.Row
             await conn.execute("PRAGMA journal_mode=WAL;")
             await conn.execute("PRAGMA synchronous=NORMAL;")
-            await conn.commit()
+            await conn.execute("PRAGMA temp_store=MEMORY;")
+            await conn.execute("PRAGMA cache_size=-64000;")
+            await conn.execute("PRAGMA foreign_keys=ON;")
+        except BaseException:
+            self._open_connections.discard(conn)
+            await conn.close()
+            raise
+        return conn
+
+    def _connection(self):
+        if self._pool is None:
+            raise RuntimeError("DatabaseService.connect() must be awaited first")
+        return self._pool.connection()
+
+    async def connect(self) -> None:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        if self._pool is None:
+            self._pool = SQLiteConnectionPool(self._make_connection, pool_size=self.pool_size)
         self._connected = True
 
     async def disconnect(self) -> None:
-        self._connected = False
+        if self._flusher_task is not None:
+            self._flusher_task.cancel()
+            try:
+                await self._flusher_task
+            except asyncio.CancelledError:
+                pass
+            self._flusher_task = None
+        try:
+            if self._pool is not None:
+                await self.flush()
+        finally:
+            if self._pool is not None:
+                await self._pool.close()
+                self._pool = None
+            connections, self._open_connections = self._open_connections, set()
+            await asyncio.gather(*(conn.close() for conn in connections), return_exceptions=True)
+            self._connected = False
 
     async def is_connected(self) -> bool:
         return self._connected
 
     async def init_schema(self) -> None:
-        async with aiosqlite.connect(self.db_path) as conn:
-            await conn.execute("PRAGMA foreign_keys = ON;")
+        async with self._connection() as conn:
             await conn.executescript(
                 """
                 CREATE TABLE IF NOT EXISTS versions (
@@ -40,6 +152,9 @@ class DatabaseService:
                     decompiled INTEGER DEFAULT 0,
                     file_count INTEGER,
                     size_bytes INTEGER,
+                    total_classes INTEGER DEFAULT 0,
+                    total_lines INTEGER DEFAULT 0,
+                    total_packages INTEGER DEFAULT 0,
                     created_at TEXT DEFAULT CURRENT_TIMESTAMP
                 );
 
@@ -47,52 +162,93 @@ class DatabaseService:
                 CREATE INDEX IF NOT EXISTS idx_versions_decompiled ON versions(decompiled);
                 CREATE INDEX IF NOT EXISTS idx_versions_release_time ON versions(release_time);
 
-                CREATE TABLE IF NOT EXISTS files (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    version_id TEXT NOT NULL,
-                    path TEXT NOT NULL,
-                    package TEXT,
-                    class_name TEXT,
-                    size_bytes INTEGER NOT NULL,
-                    line_count INTEGER,
-                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(version_id, path),
-                    FOREIGN KEY(version_id) REFERENCES versions(id) ON DELETE CASCADE
-                );
-
-                CREATE INDEX IF NOT EXISTS idx_files_version ON files(version_id);
-                CREATE INDEX IF NOT EXISTS idx_files_package ON files(package);
-                CREATE INDEX IF NOT EXISTS idx_files_class ON files(class_name);
-
                 CREATE TABLE IF NOT EXISTS file_tree_cache (
                     version_id TEXT PRIMARY KEY,
                     tree_json TEXT NOT NULL,
                     updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
                     FOREIGN KEY(version_id) REFERENCES versions(id) ON DELETE CASCADE
                 );
+
+                CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+                    version_id UNINDEXED,
+                    path UNINDEXED,
+                    content,
+                    tokenize='trigram'
+                );
+
+                CREATE TABLE IF NOT EXISTS search_indexed_versions (
+                    version_id TEXT PRIMARY KEY,
+                    indexed_at TEXT DEFAULT CURRENT_TIMESTAMP
+                );
+                """
+            )
+            await self._migrate_files_table(conn)
+            await self._migrate_version_totals(conn)
+            await conn.executescript(
+                FILES_TABLE_SQL
+                + """
+                CREATE INDEX IF NOT EXISTS idx_files_version ON files(version_id);
+                CREATE INDEX IF NOT EXISTS idx_files_package ON files(package);
+                CREATE INDEX IF NOT EXISTS idx_files_class ON files(class_name);
+                CREATE INDEX IF NOT EXISTS idx_files_version_class
+                    ON files(version_id, class_name);
+                CREATE INDEX IF NOT EXISTS idx_files_version_package
+                    ON files(version_id, package);
+                CREATE INDEX IF NOT EXISTS idx_files_version_size
+                    ON files(version_id, size_bytes, line_count);
                 """
             )
             await conn.commit()
 
+    async def _migrate_files_table(self, conn: aiosqlite.Connection) -> None:
+        # files tables created before package/class_name became generated columns are
+        # rebuilt; generated columns cannot be added to an existing table with ALTER
+        cursor = await conn.execute("PRAGMA table_xinfo(files)")
+        columns = {row["name"]: row["hidden"] for row in await cursor.fetchall()}
+        await cursor.close()
+        if not columns or columns.get("package") == 3:
+            return
+
+        await conn.executescript(
+            "BEGIN; ALTER TABLE files RENAME TO files_legacy;"
+            + FILES_TABLE_SQL
+            + """
+            INSERT INTO files (id, version_id, path, size_bytes, line_count, created_at)
+            SELECT id, version_id, path, size_bytes, line_count, created_at FROM files_legacy;
+            DROP TABLE files_legacy;
+            COMMIT;
+            """
+        )
+
+    async def _migrate_version_totals(self, conn: aiosqlite.Connection) -> None:
+        cursor = await conn.execute("PRAGMA table_info(versions)")
+        columns = {row["name"] for row in await cursor.fetchall()}
+        await cursor.close()
+        missing = [column for column in VERSION_TOTALS_COLUMNS if column not in columns]
+        if not missing:
+            return
+
+        for column in missing:
+            await conn.execute(f"ALTER TABLE versions ADD COLUMN {column} INTEGER DEFAULT 0")
+        await conn.execute(REFRESH_VERSION_TOTALS_SQL)
+        await conn.commit()
+
     async def _fetchall(self, query: str, params: tuple = ()) -> list[aiosqlite.Row]:
-        async with aiosqlite.connect(self.db_path) as conn:
-            conn.row_factory = aiosqlite.Row
+        async with self._connection() as conn:
             cursor = await conn.execute(query, params)
             rows = await cursor.fetchall()
             await cursor.close()
             return rows
 
     async def _fetchone(self, query: str, params: tuple = ()) -> Optional[aiosqlite.Row]:
-        async with aiosqlite.connect(self.db_path) as conn:
-            conn.row_factory = aiosqlite.Row
+        async with self._connection() as conn:
             cursor = await conn.execute(query, params)
             row = await cursor.fetchone()
             await cursor.close()
             return row
 
     async def execute(self, query: str, params: tuple = ()) -> None:
-        async with aiosqlite.connect(self.db_path) as conn:
-            await conn.execute("PRAGMA foreign_keys = ON;")
+        async with self._connection() as conn:
             await conn.execute(query, params)
             await conn.commit()
 
@@ -104,7 +260,7 @@ class DatabaseService:
             ORDER BY release_time DESC
             """
         )
-        return [VersionInfo(**dict(row)) for row in rows]
+        return [self._version_from_row(row) for row in rows]
 
     async def get_version(self, version_id: str) -> Optional[VersionInfo]:
         row = await self._fetchone(
@@ -115,7 +271,20 @@ class DatabaseService:
             """,
             (version_id,),
         )
-        return VersionInfo(**dict(row)) if row else None
+        return self._version_from_row(row) if row else None
+
+    @staticmethod
+    def _version_from_row(row: aiosqlite.Row) -> VersionInfo:
+        # rows were validated on the way in; only the SQLite storage types need converting
+        return VersionInfo.model_construct(
+            id=row["id"],
+            type=row["type"],
+            url=row["url"],
+            release_time=datetime.fromisoformat(row["release_time"]),
+            decompiled=bool(row["decompiled"]),
+            file_count=row["file_count"],
+            size_bytes=row["size_bytes"],
+        )
 
     async def get_decompiled_versions(self) -> List[str]:
         rows = await self._fetchall(
@@ -125,23 +294,49 @@ class DatabaseService:
 
     async def upsert_version(self, version: VersionInfo) -> None:
         release_time = version.release_time.isoformat()
+        async with self._connection() as conn:
+            await conn.execute(
+                """
+                INSERT INTO versions
+                    (id, type, url, release_time, decompiled, file_count, size_bytes)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    type=excluded.type,
+                    url=excluded.url,
+                    release_time=excluded.release_time,
+                    decompiled=excluded.decompiled,
+                    file_count=excluded.file_count,
+                    size_bytes=excluded.size_bytes
+                """,
+                (
+                    version.id,
+                    version.type,
+                    version.url,
+                    release_time,
+                    1 if version.decompiled else 0,
+                    version.file_count,
+                    version.size_bytes,
+                ),
+            )
+            # the totals are aggregated once here, after a version's files are ingested,
+            # rather than on every bulk insert
+            await conn.execute(REFRESH_VERSION_TOTALS_SQL + " WHERE id = ?", (version.id,))
+            await conn.commit()
+
+    async def ensure_version(self, version: VersionInfo) -> None:
+        """Insert the version row if it is missing; files reference it by foreign key."""
         await self.execute(
             """
-            INSERT INTO versions (id, type, url, release_time, decompiled, file_count, size_bytes)
+            INSERT INTO versions
+                (id, type, url, release_time, decompiled, file_count, size_bytes)
             VALUES (?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(id) DO UPDATE SET
-                type=excluded.type,
-                url=excluded.url,
-                release_time=excluded.release_time,
-                decompiled=excluded.decompiled,
-                file_count=excluded.file_count,
-                size_bytes=excluded.size_bytes
+            ON CONFLICT(id) DO NOTHING
             """,
             (
                 version.id,
                 version.type,
                 version.url,
-                release_time,
+                version.release_time.isoformat(),
                 1 if version.decompiled else 0,
                 version.file_count,
                 version.size_bytes,
@@ -149,68 +344,109 @@ class DatabaseService:
         )
 
     async def add_file(self, version_id: str, path: str, size: int, line_count: int = 0) -> None:
-        package = None
-        class_name = None
-        if path.endswith(".java"):
-            parts = path.replace("\\", "/").split("/")
-            if len(parts) > 1:
-                class_name = parts[-1].replace(".java", "")
-                package = ".".join(parts[:-1])
-
-        await self.execute(
-            """
-            INSERT INTO files (version_id, path, package, class_name, size_bytes, line_count)
-            VALUES (?, ?, ?, ?, ?, ?)
-            ON CONFLICT(version_id, path) DO UPDATE SET
-                size_bytes=excluded.size_bytes,
-                line_count=excluded.line_count,
-                package=excluded.package,
-                class_name=excluded.class_name
-            """,
-            (version_id, path, package, class_name, size, line_count),
-        )
+        """Queue a file record; it is written by the next flush, see flush()."""
+        # started on first use, so processes that never queue records do not poll
+        if self._flusher_task is None:
+            self._flusher_task = asyncio.create_task(self._flusher())
+        async with self._pending_lock:
+            self._pending.append((version_id, path, size, line_count))
+            if len(self._pending) >= PENDING_FLUSH_THRESHOLD:
+                self._pending_full.set()
+
+    async def flush(self) -> None:
+        async with self._pending_lock:
+            records, self._pending = self._pending, []
+            self._pending_full.clear()
+        if records:
+            await self._insert_file_records(records)
+
+    async def _flusher(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._pending_full.wait(), PENDING_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush queued file records")
 
     async def add_files_bulk(self, version_id: str, files: List[dict]) -> None:
         if not files:
             return
 
-        records = []
-        for file_info in files:
-            path = file_info["path"]
-            package = file_info.get("package")
-            class_name = file_info.get("class_name")
-            size = file_info.get("size_bytes", 0)
-            line_count = file_info.get("line_count", 0)
-            records.append((version_id, path, package, class_name, size, line_count))
-
-        async with aiosqlite.connect(self.db_path) as conn:
-            await conn.execute("PRAGMA foreign_keys = ON;")
-            await conn.executemany(
-                """
-                INSERT INTO files (version_id, path, package, class_name, size_bytes, line_count)
-                VALUES (?, ?, ?, ?, ?, ?)
-                ON CONFLICT(version_id, path) DO UPDATE SET
-                    size_bytes=excluded.size_bytes,
-                    line_count=excluded.line_count,
-                    package=excluded.package,
-                    class_name=excluded.class_name
-                """,
-                records,
+        await self._insert_file_records(
+            (
+                version_id,
+                file_info["path"],
+                file_info.get("size_bytes", 0),
+                file_info.get("line_count", 0),
             )
-            await conn.commit()
+            for file_info in files
+        )
 
-    async def get_file_tree(self, version_id: str) -> Optional[dict]:
+    async def _insert_file_records(self, records: Iterable[FileRecord]) -> None:
+        # version totals are left to upsert_version; ingest calls this once per chunk
+        records = iter(records)
+        async with self._connection() as conn:
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                while batch := list(islice(records, BULK_INSERT_BATCH_SIZE)):
+                    await conn.executemany(
+                        """
+                        INSERT INTO files (version_id, path, size_bytes, line_count)
+                        VALUES (?, ?, ?, ?)
+                        ON CONFLICT(version_id, path) DO UPDATE SET
+                            size_bytes=excluded.size_bytes,
+                            line_count=excluded.line_count
+                        """,
+                        batch,
+                    )
+            except BaseException:
+                await conn.execute("ROLLBACK")
+                raise
+            await conn.execute("COMMIT")
+
+    async def list_file_paths(self, version_id: str, directory: str = "") -> List[str]:
+        query = "SELECT path FROM files WHERE version_id = ? AND substr(path, -5) = '.java'"
+        params: tuple = (version_id,)
+        directory = directory.strip("/")
+        if directory:
+            # a range on the (version_id, path) unique index; '0' sorts right after '/'
+            query += " AND path >= ? AND path < ?"
+            params += (directory + "/", directory + "0")
+        rows = await self._fetchall(query + " ORDER BY path", params)
+        return [row["path"] for row in rows]
+
+    async def count_files(self, version_id: str) -> int:
         row = await self._fetchone(
-            "SELECT tree_json FROM file_tree_cache WHERE version_id = ?",
+            "SELECT COUNT(*) as total FROM files WHERE version_id = ?", (version_id,)
+        )
+        return int(row["total"]) if row else 0
+
+    async def get_files_size(self, version_id: str) -> int:
+        row = await self._fetchone(
+            "SELECT COALESCE(SUM(size_bytes), 0) as total FROM files WHERE version_id = ?",
             (version_id,),
         )
-        if row:
+        return int(row["total"]) if row else 0
+
+    async def get_file_tree(self, version_id: str) -> Optional[dict]:
+        tree_json = await self.get_file_tree_json(version_id)
+        if tree_json:
             try:
-                return json.loads(row["tree_json"])
-            except json.JSONDecodeError:
+                return orjson.loads(tree_json)
+            except orjson.JSONDecodeError:
                 return None
         return None
 
+    async def get_file_tree_json(self, version_id: str) -> Optional[str]:
+        row = await self._fetchone(
+            "SELECT tree_json FROM file_tree_cache WHERE version_id = ?",
+            (version_id,),
+        )
+        return row["tree_json"] if row else None
+
     async def cache_file_tree(self, version_id: str, tree: dict) -> None:
         await self.execute(
             """
@@ -220,27 +456,111 @@ class DatabaseService:
                 tree_json=excluded.tree_json,
                 updated_at=CURRENT_TIMESTAMP
             """,
-            (version_id, json.dumps(tree)),
+            (version_id, orjson.dumps(tree).decode()),
         )
 
     async def get_version_stats(self, version_id: str) -> Optional[VersionStats]:
         row = await self._fetchone(
             """
             SELECT
-                v.id as version,
-                COALESCE(v.file_count, 0) as total_files,
-                COUNT(DISTINCT f.class_name) as total_classes,
-                COALESCE(SUM(f.line_count), 0) as total_lines,
-                COALESCE(v.size_bytes, 0) as size_bytes,
-                COUNT(DISTINCT f.package) as packages
-            FROM versions v
-            LEFT JOIN files f ON v.id = f.version_id
-            WHERE v.id = ?
-            GROUP BY v.id, v.file_count, v.size_bytes
+                id as version,
+                COALESCE(file_count, 0) as total_files,
+                COALESCE(total_classes, 0) as total_classes,
+                COALESCE(total_lines, 0) as total_lines,
+                COALESCE(size_bytes, 0) as size_bytes,
+                COALESCE(total_packages, 0) as packages
+            FROM versions
+            WHERE id = ?
             """,
             (version_id,),
         )
-        return VersionStats(**dict(row)) if row else None
+        return VersionStats.model_construct(**dict(row)) if row else None
+
+    async def clear_search_documents(self, version_id: str) -> None:
+        async with self._connection() as conn:
+            await conn.execute(
+                "DELETE FROM search_indexed_versions WHERE version_id = ?", (version_id,)
+            )
+            await conn.execute("DELETE FROM files_fts WHERE version_id = ?", (version_id,))
+            await conn.commit()
+
+    async def add_search_documents(
+        self, version_id: str, documents: Iterable[Tuple[str, str]]
+    ) -> None:
+        documents = iter(documents)
+        async with self._connection() as conn:
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                while batch := list(islice(documents, BULK_INSERT_BATCH_SIZE)):
+                    await conn.executemany(
+                        "INSERT INTO files_fts (version_id, path, content) VALUES (?, ?, ?)",
+                        [(version_id, path, content) for path, content in batch],
+                    )
+            except BaseException:
+                await conn.execute("ROLLBACK")
+                raise
+            await conn.execute("COMMIT")
+
+    async def mark_search_indexed(self, version_id: str) -> None:
+        await self.execute(
+            """
+            INSERT INTO search_indexed_versions (version_id) VALUES (?)
+            ON CONFLICT(version_id) DO UPDATE SET indexed_at=CURRENT_TIMESTAMP
+            """,
+            (version_id,),
+        )
+
+    async def get_search_indexed_versions(self) -> List[str]:
+        rows = await self._fetchall("SELECT version_id FROM search_indexed_versions")
+        return [row["version_id"] for row in rows]
+
+    async def search_files(
+        self, query: str, versions: List[str], limit: int, offset: int
+    ) -> Tuple[int, List[aiosqlite.Row]]:
+        """Substring search over indexed file contents, best bm25 score first.
+
+        Rows carry version_id, path, score, the 1-based match position (0 when
+        the case-folded match could not be located) and a window of content
+        starting at window_start around it.
+        """
+        match = '"' + query.replace('"', '""') + '"'
+        placeholders = ", ".join("?" * len(versions))
+        filter_sql = f"files_fts MATCH ? AND version_id IN ({placeholders})"
+
+        row = await self._fetchone(
+            f"SELECT COUNT(*) as total FROM files_fts WHERE {filter_sql}",
+            (match, *versions),
+        )
+        total = int(row["total"]) if row else 0
+        if total <= offset:
+            return total, []
+
+        rows = await self._fetchall(
+            f"""
+            WITH matches AS (
+                SELECT version_id, path, content, bm25(files_fts) as rank_score
+                FROM files_fts
+                WHERE {filter_sql}
+                ORDER BY rank_score
+                LIMIT ? OFFSET ?
+            ), located AS (
+                SELECT *, instr(lower(content), ?) as pos FROM matches
+            )
+            SELECT
+                version_id,
+                path,
+                -rank_score as score,
+                pos,
+                max(pos - 1 - length(replace(substr(content, 1, pos - 1), char(10), '')), 0)
+                    + 1 as line_number,
+                max(pos - {SNIPPET_WINDOW}, 1) as window_start,
+                substr(content, max(pos - {SNIPPET_WINDOW}, 1), ?) as window
+            FROM located
+            ORDER BY rank_score
+            """,
+            (match, *versions, limit, offset, query.lower(), 2 * SNIPPET_WINDOW + len(query)),
+        )
+        return total, rows
 
     async def get_version_count(self) -> int:
         row = await self._fetchone(
@@ -250,6 +570,3 @@ class DatabaseService:
 
 
 db = DatabaseService()
-
-
-db = DatabaseService()
@@ -11,81 +11,108 @@ from app.models.schemas import FileContent, FileNode
 class FileService:
     def __init__(self):
         self.data_dir = settings.data_dir
+        self.cache_ttl = settings.cache_ttl
 
     def get_file_path(self, version: str, relative_path: str) -> Path:
         return self.data_dir / version / "src" / relative_path
 
-    async def get_file_content(self, version: str, path: str) -> Optional[FileContent]:
+    async def get_file_content_bytes(self, version: str, path: str) -> Optional[bytes]:
+        """UTF-8 bytes of a file, or None if it is missing or does not decode."""
         cache_key = cache.cache_key_file(version, path)
-        cached = await cache.get_str(cache_key)
-        if cached:
-            file_path = self.get_file_path(version, path)
-            size = file_path.stat().st_size if file_path.exists() else 0
-            return FileContent(
-                path=path, content=cached, size=size, language="java", version=version
-            )
+        cached = await cache.get_bytes(cache_key)
+        if cached is not None:
+            return cached
 
         file_path = self.get_file_path(version, path)
-        if not file_path.exists():
-            return None
-
         try:
-            async with aiofiles.open(file_path, "r", encoding="utf-8") as f:
+            async with aiofiles.open(file_path, "rb") as f:
                 content = await f.read()
+            # validated once on the way in; hits are served without decoding
+            content.decode("utf-8")
+        except (OSError, UnicodeDecodeError):
+            return None
 
-            size = file_path.stat().st_size
+        await cache.set_bytes(cache_key, content, ttl=self.cache_ttl)
+        return content
 
-            await cache.set_str(cache_key, content, ttl=settings.cache_ttl)
+    async def read_file_content(self, version: str, path: str) -> Optional[FileContent]:
+        """Read a file without the cache; bulk scans use this so they do not evict it."""
+        file_path = self.get_file_path(version, path)
+        try:
+            size = file_path.stat().st_size
+        except OSError:
+            return None
 
-            return FileContent(
-                path=path, content=content, size=size, language="java", version=version
-            )
+        try:
+            async with aiofiles.open(file_path, "r", encoding="utf-8") as f:
+                content = await f.read()
         except Exception:
             return None
 
-    async def get_file_tree(self, version: str) -> Optional[FileNode]:
-        cache_key = cache.cache_key_tree(version)
-        cached = await cache.get_json(cache_key)
-        if cached:
-            return FileNode(**cached)
+        return FileContent(
+            path=path, content=content, size=size, language="java", version=version
+        )
+
+    async def get_file_tree_json(self, version: str) -> Optional[bytes]:
+        # the tree is persisted as JSON at ingest and served as stored, with no model round
+        # trip; only versions indexed before that are rebuilt here
+        tree_json = await db.get_file_tree_json(version)
+        if tree_json:
+            return tree_json.encode()
 
-        db_cached = await db.get_file_tree(version)
-        if db_cached:
-            await cache.set_json(cache_key, db_cached, ttl=settings.cache_ttl)
-            return FileNode(**db_cached)
+        tree = await self.rebuild_file_tree(version)
+        return tree.model_dump_json().encode() if tree else None
 
+    async def rebuild_file_tree(self, version: str) -> Optional[FileNode]:
         version_dir = self.data_dir / version / "src"
         if not version_dir.exists():
             return None
 
-        tree = self._build_tree(version_dir, version_dir)
+        tree = self._build_tree(version_dir)
 
-        tree_dict = tree.model_dump()
-        await cache.set_json(cache_key, tree_dict, ttl=settings.cache_ttl)
-        await db.cache_file_tree(version, tree_dict)
+        await db.cache_file_tree(version, tree.model_dump())
 
         return tree
 
-    def _build_tree(self, root: Path, current: Path) -> FileNode:
-        relative = current.relative_to(root)
-        name = current.name if current != root else "src"
-
-        if current.is_file():
-            size = current.stat().st_size
-            return FileNode(
-                name=name, path=str(relative), type="file", size=size, children=None
-            )
-
-        children = []
-        try:
-            for child in sorted(current.iterdir(), key=lambda x: (not x.is_dir(), x.name)):
-                children.append(self._build_tree(root, child))
-        except PermissionError:
-            pass
+    def _build_tree(self, root: Path) -> FileNode:
+        # iterative walk: DirEntry caches type/stat info from the directory read, and the
+        # tree is built from trusted filesystem data so pydantic validation is skipped
+        tree = FileNode.model_construct(name="src", path=".", type="directory", children=[])
+        stack = [(str(root), "", tree)]
+        while stack:
+            dir_path, relative, node = stack.pop()
+            try:
+                with os.scandir(dir_path) as it:
+                    entries = sorted(
+                        it, key=lambda e: (not e.is_dir(follow_symlinks=False), e.name)
+                    )
+            except PermissionError:
+                continue
+
+            for entry in entries:
+                child_path = os.path.join(relative, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    child = FileNode.model_construct(
+                        name=entry.name, path=child_path, type="directory", children=[]
+                    )
+                    stack.append((entry.path, child_path, child))
+                else:
+                    child = FileNode.model_construct(
+                        name=entry.name,
+                        path=child_path,
+                        type="file",
+                        size=entry.stat(follow_symlinks=False).st_size,
+                    )
+                node.children.append(child)
 
-        return FileNode(name=name, path=str(relative), type="directory", children=children)
+        return tree
 
     async def list_files(self, version: str, directory: str = "") -> List[str]:
+        files = await db.list_file_paths(version, directory)
+        if files:
+            return files
+
+        # versions not indexed into the files table yet
         dir_path = self.data_dir / version / "src" / directory
         if not dir_path.exists() or not dir_path.is_dir():
             return []
@@ -97,18 +124,29 @@ class FileService:
 
         return sorted(files)
 
-    def get_version_size(self, version: str) -> int:
+    async def get_version_size(self, version: str) -> int:
+        """Total size in bytes of the version's .java sources (other files are not counted)."""
+        # the files table only holds .java files, so the walk counts the same set
+        size = await db.get_files_size(version)
+        if size:
+            return size
+
         version_dir = self.data_dir / version / "src"
         if not version_dir.exists():
             return 0
 
         total = 0
-        for item in version_dir.rglob("*"):
+        for item in version_dir.rglob("*.java"):
             if item.is_file():
                 total += item.stat().st_size
         return total
 
-    def count_files(self, version: str) -> int:
+    async def count_files(self, version: str) -> int:
+        """Number of .java sources in the version, from the index or a directory walk."""
+        count = await db.count_files(version)
+        if count:
+            return count
+
         version_dir = self.data_dir / version / "src"
         if not version_dir.exists():
             return 0
@@ -1,22 +1,43 @@
+import asyncio
+import re
 import time
-from typing import Dict, List, Optional
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 
 from app.config import settings
 from app.models.schemas import SearchRequest, SearchResponse, SearchResult
 from app.services.file_service import file_service
-from app.services.database import db
+from app.services.database import SNIPPET_WINDOW, db
+
+# the trigram index cannot match shorter queries; those use the linear scan
+MIN_INDEXED_QUERY_LENGTH = 3
+
+# files read concurrently per step of the linear scan
+SEARCH_CONCURRENCY = 32
+
+# newline offsets of recently matched files; a small LRU of its own, so the linear scan
+# never pushes entries out of the shared response cache
+LINE_OFFSETS_CACHE_SIZE = 1024
+
+NEWLINE = re.compile("\n")
 
 
 class SearchService:
     def __init__(self) -> None:
+        self.data_dir = settings.data_dir
         self._ready = False
         self._file_registry: Dict[str, List[str]] = {}
+        # (version, path) -> (content length, newline offsets)
+        self._line_offsets: "OrderedDict[Tuple[str, str], Tuple[int, array]]" = OrderedDict()
 
     async def connect(self) -> None:
         await self.refresh_index()
 
     async def init_index(self) -> None:
-        await self.refresh_index()
+        if not self._ready:
+            await self.refresh_index()
 
     async def refresh_index(self) -> None:
         versions: List[str] = []
@@ -25,11 +46,11 @@ class SearchService:
         except Exception:
             versions = []
 
-        if not versions and settings.data_dir.exists():
-            versions = [d.name for d in settings.data_dir.iterdir() if d.is_dir()]
+        if not versions and self.data_dir.exists():
+            versions = [d.name for d in self.data_dir.iterdir() if d.is_dir()]
 
-        for version in versions:
-            self._file_registry[version] = await file_service.list_files(version)
+        file_lists = await asyncio.gather(*(file_service.list_files(v) for v in versions))
+        self._file_registry.update(zip(versions, file_lists))
 
         self._ready = True
 
@@ -41,10 +62,24 @@ class SearchService:
             files = await file_service.list_files(version)
         self._file_registry[version] = files
 
+    def _get_line_offsets(self, version: str, path: str, content: str) -> array:
+        key = (version, path)
+        cached = self._line_offsets.get(key)
+        # the length guards against a file rewritten since its offsets were taken
+        if cached is not None and cached[0] == len(content):
+            self._line_offsets.move_to_end(key)
+            return cached[1]
+
+        offsets = array("q", [m.start() for m in NEWLINE.finditer(content)])
+        self._line_offsets[key] = (len(content), offsets)
+        self._line_offsets.move_to_end(key)
+        if len(self._line_offsets) > LINE_OFFSETS_CACHE_SIZE:
+            self._line_offsets.popitem(last=False)
+        return offsets
+
     def _build_snippet(self, content: str, index: int, length: int) -> str:
-        window = 150
-        start = max(0, index - window)
-        end = min(len(content), index + length + window)
+        start = max(0, index - SNIPPET_WINDOW)
+        end = min(len(content), index + length + SNIPPET_WINDOW)
         snippet = content[start:end].strip().replace("\n", " ")
         return snippet
 
@@ -57,9 +92,51 @@ class SearchService:
         query = request.query.lower()
         versions = request.versions or list(self._file_registry.keys())
 
-        if not versions and settings.data_dir.exists():
-            versions = [d.name for d in settings.data_dir.iterdir() if d.is_dir()]
+        if not versions and self.data_dir.exists():
+            versions = [d.name for d in self.data_dir.iterdir() if d.is_dir()]
+
+        if len(query) >= MIN_INDEXED_QUERY_LENGTH and versions:
+            indexed = set(await db.get_search_indexed_versions())
+            if indexed.issuperset(versions):
+                return await self._search_index(request, versions, start_time)
+
+        return await self._search_files(request, versions, start_time)
+
+    async def _search_index(
+        self, request: SearchRequest, versions: List[str], start_time: float
+    ) -> SearchResponse:
+        total_matches, rows = await db.search_files(
+            request.query, versions, request.limit, request.offset
+        )
+
+        results = [
+            SearchResult(
+                version=row["version_id"],
+                file_path=row["path"],
+                class_name=None,
+                line_number=row["line_number"],
+                snippet=self._build_snippet(
+                    row["window"], max(row["pos"] - row["window_start"], 0), len(request.query)
+                ),
+                score=row["score"],
+            )
+            for row in rows
+        ]
+
+        processing_time = (time.perf_counter() - start_time) * 1000
+
+        return SearchResponse(
+            query=request.query,
+            total=total_matches,
+            results=results,
+            processing_time_ms=round(processing_time, 2),
+        )
 
+    async def _search_files(
+        self, request: SearchRequest, versions: List[str], start_time: float
+    ) -> SearchResponse:
+        # compiled once per search; matching the original text needs no lowercased copy
+        pattern = re.compile(re.escape(request.query), re.IGNORECASE)
         results: List[SearchResult] = []
         total_matches = 0
 
@@ -69,36 +146,47 @@ class SearchService:
                 file_paths = await file_service.list_files(version)
                 self._file_registry[version] = file_paths
 
-            for file_path in file_paths:
-                file_content = await file_service.get_file_content(version, file_path)
-                if not file_content or not file_content.content:
-                    continue
-
-                lower_content = file_content.content.lower()
-                match_index = lower_content.find(query)
-                if match_index == -1:
-                    continue
-
-                total_matches += 1
-                if total_matches <= request.offset:
-                    continue
-                if len(results) >= request.limit:
-                    continue
-
-                line_number = file_content.content.count("\n", 0, match_index) + 1
-                snippet = self._build_snippet(file_content.content, match_index, len(query))
-
-                results.append(
-                    SearchResult(
-                        version=version,
-                        file_path=file_path,
-                        class_name=None,
-                        line_number=line_number,
-                        snippet=snippet,
-                        score=1.0,
-                    )
+            for start in range(0, len(file_paths), SEARCH_CONCURRENCY):
+                chunk = file_paths[start : start + SEARCH_CONCURRENCY]
+                # read past the cache: one scan would otherwise evict every hot entry
+                contents = await asyncio.gather(
+                    *(file_service.read_file_content(version, path) for path in chunk)
                 )
 
+                for file_path, file_content in zip(chunk, contents):
+                    if not file_content or not file_content.content:
+                        continue
+
+                    match = pattern.search(file_content.content)
+                    if match is None:
+                        continue
+
+                    total_matches += 1
+                    if total_matches <= request.offset:
+                        continue
+                    if len(results) >= request.limit:
+                        continue
+
+                    match_index = match.start()
+                    line_offsets = self._get_line_offsets(
+                        version, file_path, file_content.content
+                    )
+                    line_number = bisect_left(line_offsets, match_index) + 1
+                    snippet = self._build_snippet(
+                        file_content.content, match_index, match.end() - match_index
+                    )
+
+                    results.append(
+                        SearchResult(
+                            version=version,
+                            file_path=file_path,
+                            class_name=None,
+                            line_number=line_number,
+                            snippet=snippet,
+                            score=1.0,
+                        )
+                    )
+
         processing_time = (time.perf_counter() - start_time) * 1000
 
         return SearchResponse(
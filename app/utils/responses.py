@@ -0,0 +1,22 @@
+from typing import Any
+
+import orjson
+from blacksheep import Content, Request, Response
+
+
+def raw_json_response(body: bytes, status: int = 200) -> Response:
+    return Response(status, content=Content(b"application/json", body))
+
+
+def orjson_response(obj: Any, status: int = 200) -> Response:
+    return raw_json_response(orjson.dumps(obj), status)
+
+
+def etag_json_response(request: Request, body: bytes, etag: bytes) -> Response:
+    if_none_match = request.get_first_header(b"If-None-Match")
+    if if_none_match and etag in (tag.strip() for tag in if_none_match.split(b",")):
+        response = Response(304)
+    else:
+        response = raw_json_response(body)
+    response.headers[b"ETag"] = etag
+    return response
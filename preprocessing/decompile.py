@@ -2,11 +2,69 @@ import asyncio
 import os
 import platform
 import shutil
+import stat
 import tarfile
 import urllib.request
+from collections import deque
 from pathlib import Path
 from typing import Optional
 
+# decompiler output is forwarded line by line; only this many trailing stderr lines are
+# kept in memory for the failure message
+STDERR_TAIL_LINES = 20
+STREAM_LINE_LIMIT = 1024 * 1024
+
+# read and copy buffers for JRE extraction; tarfile's defaults are 10-16 KiB
+TAR_BUFFER_SIZE = 2 * 1024 * 1024
+
+# percent of the host's (or container's) memory given to decompiler heaps, split evenly
+# across the concurrently running JVMs. Thread stacks, metaspace and the JIT come on top
+# of each heap, so the other half is their headroom; with the defaults two JVMs get a 25%
+# heap each. The JVM reads cgroup limits, so this follows the container's memory cap.
+JAVA_HEAP_RAM_PERCENT = 50
+
+
+def _scandir_recursive(root):
+    """Yield a DirEntry for every regular file under root, reusing scandir's cached stat."""
+    try:
+        it = os.scandir(root)
+    except OSError:
+        return
+    with it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _scandir_recursive(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+def _stat_or_none(path: Path) -> Optional[os.stat_result]:
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+def _chmod_jre(root: Path) -> None:
+    """Make directories and anything under a bin/ directory 0755, other files 0644."""
+    # chmod by name relative to an open directory fd, using the types scandir already read
+    stack = [(str(root), False)]
+    while stack:
+        dir_path, in_bin = stack.pop()
+        dir_fd = os.open(dir_path, os.O_RDONLY)
+        try:
+            with os.scandir(dir_fd) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        os.chmod(entry.name, 0o755, dir_fd=dir_fd)
+                        if not entry.is_symlink():
+                            child_path = os.path.join(dir_path, entry.name)
+                            stack.append((child_path, in_bin or entry.name == "bin"))
+                    else:
+                        os.chmod(entry.name, 0o755 if in_bin else 0o644, dir_fd=dir_fd)
+        finally:
+            os.close(dir_fd)
+
 
 class MinecraftDecompiler:
     def __init__(
@@ -16,28 +74,37 @@ class MinecraftDecompiler:
         decompiler_type: str = "fernflower",
         threads: int = 8,
         regenerate_vars: bool = True,
+        concurrent_versions: int = 2,
+        java_heap: Optional[str] = None,
     ):
         self.decompiler_jar = decompiler_jar
         self.data_dir = data_dir
         self.decompiler_type = decompiler_type
         self.threads = threads
         self.regenerate_vars = regenerate_vars
-
-        self.java_path = self.ensure_java()
-        print(f"[OK] Using Java at: {self.java_path}")
-
-    def ensure_java(self) -> str:
+        # versions are independent JVM runs; each already uses `threads` workers
+        self.concurrent_versions = concurrent_versions
+        # an explicit -Xmx value; by default the heap is sized from available memory
+        self.java_heap = java_heap
+        self.java_path: Optional[str] = None
+        # (java file count, size in bytes) per output dir, so each one is walked once
+        self._output_summaries: dict[Path, tuple[int, int]] = {}
+
+    async def ensure_java(self) -> str:
         """Ensure Java is installed and available in PATH."""
         java_exec = shutil.which("java")
         if java_exec:
             print("[INFO] Java already present.")
             return java_exec
 
+        # the download, extraction and permission walk all block; keep them off the loop
+        return await asyncio.to_thread(self._install_java)
+
+    def _install_java(self) -> str:
         print("[INFO] Java not found. Installing OpenJDK 21.0.9 locally...")
 
         jdk_dir = Path("./runtime/java")
         tmp_dir = jdk_dir / "tmp_extract"
-        archive_path = jdk_dir / "openjdk.tar.gz"
 
         machine = platform.machine().lower()
         if machine in ("x86_64", "amd64"):
@@ -62,14 +129,15 @@ class MinecraftDecompiler:
 
         jdk_dir.mkdir(parents=True, exist_ok=True)
 
-        print(f"[DOWNLOAD] Fetching {url}")
-        urllib.request.urlretrieve(url, archive_path)
-
-        print(f"[EXTRACT] Extracting safely to {tmp_dir}")
         tmp_dir.mkdir(parents=True, exist_ok=True)
 
-        with tarfile.open(archive_path, "r:gz") as tar:
-            tar.extractall(tmp_dir, filter="data")
+        # extract while downloading; "r|gz" reads the response as a forward-only stream
+        print(f"[DOWNLOAD] Fetching {url}")
+        print(f"[EXTRACT] Extracting safely to {tmp_dir}")
+        with urllib.request.urlopen(url) as response:
+            with tarfile.open(fileobj=response, mode="r|gz", bufsize=TAR_BUFFER_SIZE) as tar:
+                tar.copybufsize = TAR_BUFFER_SIZE
+                tar.extractall(tmp_dir, filter="data")
 
         extracted_folders = [p for p in tmp_dir.iterdir() if p.is_dir()]
         if not extracted_folders:
@@ -82,26 +150,19 @@ class MinecraftDecompiler:
         shutil.move(str(extracted_root), str(final_path))
 
         shutil.rmtree(tmp_dir, ignore_errors=True)
-        archive_path.unlink(missing_ok=True)
-
-        for root, dirs, files in os.walk(final_path):
-            for d in dirs:
-                os.chmod(os.path.join(root, d), 0o755)
-            for f in files:
-                file_path = os.path.join(root, f)
-                if "/bin/" in root or root.endswith("/bin"):
-                    os.chmod(file_path, 0o755)
-                else:
-                    os.chmod(file_path, 0o644)
-
-        bin_java = None
-        for path in final_path.rglob("bin/java"):
-            bin_java = path
-            break
+
+        # Temurin archives put the launcher at <root>/bin/java; only search if they stop doing so
+        bin_java = final_path / "bin" / "java"
+        if not bin_java.exists():
+            bin_java = next(final_path.rglob("bin/java"), None)
 
         if not bin_java or not bin_java.exists():
             raise EnvironmentError("Java binary not found in extracted JRE package.")
 
+        # the "data" filter keeps the archive's permission bits, so the walk is only a fallback
+        if not bin_java.stat().st_mode & 0o111:
+            _chmod_jre(final_path)
+
         os.environ["PATH"] = f"{bin_java.parent}:{os.environ['PATH']}"
         java_exec = shutil.which("java")
         if not java_exec:
@@ -120,15 +181,25 @@ class MinecraftDecompiler:
         output_dir = version_dir / "src"
         mapped_output = version_dir / f"{version_id}-mapped.jar"
 
-        if output_dir.exists() and output_dir.is_file():
+        # one stat answers both "is it a stray file" and "is there anything to reuse"
+        output_stat = _stat_or_none(output_dir)
+        if output_stat is not None and stat.S_ISREG(output_stat.st_mode):
             output_dir.unlink()
+            output_stat = None
 
-        if output_dir.exists() and any(output_dir.rglob("*.java")):
+        if output_stat is not None and any(
+            entry.name.endswith(".java") for entry in _scandir_recursive(output_dir)
+        ):
             print(f"  Already decompiled: {output_dir}")
             return output_dir
 
+        # size GC and heap for `threads` workers rather than whatever the container reports
         cmd = [
             "java",
+            "-XX:+UseParallelGC",
+            f"-XX:ActiveProcessorCount={self.threads}",
+            self._heap_option(),
+            "-Xss2m",
             "-jar",
             str(self.decompiler_jar),
             "-i",
@@ -153,51 +224,96 @@ class MinecraftDecompiler:
         print(f"  Running: {' '.join(cmd)}")
 
         process = await asyncio.create_subprocess_exec(
-            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=STREAM_LINE_LIMIT,
         )
-        stdout, stderr = await process.communicate()
-
-        stdout_text = stdout.decode(errors="ignore").strip()
-        stderr_text = stderr.decode(errors="ignore").strip()
-
-        if stdout_text:
-            print(f"  [STDOUT]:\n{stdout_text}")
-        if stderr_text:
-            print(f"  [STDERR]:\n{stderr_text}")
+        # versions decompile concurrently, so each forwarded line names its version
+        stdout_task = asyncio.create_task(self._drain(process.stdout, f"{version_id} STDOUT"))
+        stderr_task = asyncio.create_task(self._drain(process.stderr, f"{version_id} STDERR"))
+        await process.wait()
+        _, stderr_tail = await asyncio.gather(stdout_task, stderr_task)
 
         if process.returncode != 0:
             print(f"  Error: Decompilation failed with code {process.returncode}")
-            raise RuntimeError(f"Decompilation failed with code {process.returncode}")
-
-        java_files = list(output_dir.rglob("*.java")) if output_dir.exists() else []
-        if not java_files:
+            message = f"Decompilation failed with code {process.returncode}"
+            if stderr_tail:
+                message += f": {stderr_tail[-1]}"
+            raise RuntimeError(message)
+
+        self._output_summaries.pop(output_dir, None)
+        java_count, _ = await self.summarize_output(output_dir)
+        if not java_count:
             print(f"  Warning: No .java files found in {output_dir}")
         else:
-            print(f"  Success: Created {len(java_files)} .java files")
+            print(f"  Success: Created {java_count} .java files")
 
         print(f"  Decompilation complete: {output_dir}")
         return output_dir
 
-    def count_files(self, output_dir: Path) -> int:
-        return len(list(output_dir.rglob("*.java")))
+    def _heap_option(self) -> str:
+        if self.java_heap:
+            return f"-Xmx{self.java_heap}"
+        return f"-XX:MaxRAMPercentage={JAVA_HEAP_RAM_PERCENT / self.concurrent_versions:g}"
 
-    def get_directory_size(self, output_dir: Path) -> int:
-        return sum(f.stat().st_size for f in output_dir.rglob("*") if f.is_file())
+    async def _drain(self, stream: asyncio.StreamReader, label: str) -> list[str]:
+        tail: deque[str] = deque(maxlen=STDERR_TAIL_LINES)
+        while True:
+            try:
+                line = await stream.readline()
+            except ValueError:
+                # a line longer than STREAM_LINE_LIMIT; its buffered part is dropped
+                continue
+            if not line:
+                break
+            text = line.decode(errors="ignore").rstrip()
+            if text:
+                print(f"  [{label}] {text}")
+                tail.append(text)
+        return list(tail)
+
+    async def summarize_output(self, output_dir: Path) -> tuple[int, int]:
+        summary = self._output_summaries.get(output_dir)
+        if summary is None:
+            summary = await asyncio.to_thread(self._scan_output, output_dir)
+            self._output_summaries[output_dir] = summary
+        return summary
+
+    def _scan_output(self, output_dir: Path) -> tuple[int, int]:
+        """Return (java file count, total size in bytes) from one directory walk."""
+        file_count = 0
+        size_bytes = 0
+        for entry in _scandir_recursive(output_dir):
+            size_bytes += entry.stat().st_size
+            if entry.name.endswith(".java"):
+                file_count += 1
+        return file_count, size_bytes
 
     async def decompile_all(
         self, versions: list[tuple[str, Path, Optional[Path]]]
     ) -> list[tuple[str, Path, int, int]]:
-        results = []
-        for version_id, jar_path, mappings_path in versions:
-            try:
-                output_dir = await self.decompile_version(version_id, jar_path, mappings_path)
-                file_count = self.count_files(output_dir)
-                size_bytes = self.get_directory_size(output_dir)
-                print(f"  Files: {file_count}, Size: {size_bytes / 1024 / 1024:.2f} MB")
-                results.append((version_id, output_dir, file_count, size_bytes))
-            except Exception as e:
-                print(f"Failed to decompile {version_id}: {e}")
-        return results
+        if self.java_path is None:
+            self.java_path = await self.ensure_java()
+            print(f"[OK] Using Java at: {self.java_path}")
+
+        semaphore = asyncio.Semaphore(self.concurrent_versions)
+
+        async def run(
+            version_id: str, jar_path: Path, mappings_path: Optional[Path]
+        ) -> Optional[tuple[str, Path, int, int]]:
+            async with semaphore:
+                try:
+                    output_dir = await self.decompile_version(version_id, jar_path, mappings_path)
+                    file_count, size_bytes = await self.summarize_output(output_dir)
+                    print(f"  Files: {file_count}, Size: {size_bytes / 1024 / 1024:.2f} MB")
+                    return version_id, output_dir, file_count, size_bytes
+                except Exception as e:
+                    print(f"Failed to decompile {version_id}: {e}")
+                    return None
+
+        results = await asyncio.gather(*(run(*version) for version in versions))
+        return [result for result in results if result is not None]
 
 
 async def main():
@@ -218,16 +334,18 @@ async def main():
 
 
     versions = []
-    for version_dir in sorted(data_dir.iterdir()):
-        if not version_dir.is_dir():
-            continue
-
-        version_id = version_dir.name
+    # scandir reports the entry type with the listing, so no stat per entry
+    with os.scandir(data_dir) as it:
+        version_entries = [entry for entry in it if entry.is_dir()]
+    version_entries.sort(key=lambda entry: entry.name)
+    for entry in version_entries:
+        version_id = entry.name
+        version_dir = Path(entry.path)
         jar_path = version_dir / f"{version_id}.jar"
         mappings_path = version_dir / "client.txt"
 
-        if jar_path.exists():
-            if not mappings_path.exists():
+        if _stat_or_none(jar_path) is not None:
+            if _stat_or_none(mappings_path) is None:
                 mappings_path = None
             versions.append((version_id, jar_path, mappings_path))
             print(f"[FOUND] {version_id}")
@@ -1,22 +1,49 @@
 import asyncio
 import httpx
 import json
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Dict
 from datetime import datetime
 
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+# chunks are collected in the file buffer and hit the disk a few MiB per write()
+WRITE_BUFFER_SIZE = 8 << 20
+# progress is printed at most once per this many bytes
+PROGRESS_INTERVAL = 4 << 20
+
+
+@lru_cache(maxsize=None)
+def _version_tuple(version: str) -> tuple:
+    parts = version.split(".")
+    return tuple(int(p) if p.isdigit() else p for p in parts)
+
 
 class MinecraftVersionDownloader:
 
-    def __init__(self, data_dir: Path, min_version: str = "1.13", max_version: str = "1.21"):
+    def __init__(
+        self,
+        data_dir: Path,
+        min_version: str = "1.13",
+        max_version: str = "1.21",
+        concurrent_downloads: int = 6,
+    ):
         self.data_dir = data_dir
+        self.concurrent_downloads = concurrent_downloads
         self.min_version = self._parse_version(min_version)
         self.max_version = self._parse_version(max_version)
         self.manifest_url = "https://piston-meta.mojang.com/mc/game/version_manifest_v2.json"
+        # one pooled client for every request, so connections and TLS sessions are reused
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(300.0, connect=30.0),
+            limits=httpx.Limits(max_keepalive_connections=20),
+        )
+
+    async def close(self) -> None:
+        await self._client.aclose()
 
     def _parse_version(self, version: str) -> tuple:
-        parts = version.split(".")
-        return tuple(int(p) if p.isdigit() else p for p in parts)
+        return _version_tuple(version)
 
     def _version_in_range(self, version: str) -> bool:
         try:
@@ -26,32 +53,30 @@ class MinecraftVersionDownloader:
             return False
 
     async def get_version_manifest(self) -> List[Dict]:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(self.manifest_url, timeout=30.0)
-            response.raise_for_status()
-            manifest = response.json()
-
-            # filter versions in range
-            filtered = []
-            for version in manifest["versions"]:
-                vid = version["id"]
-                if self._version_in_range(vid):
-                    filtered.append(
-                        {
-                            "id": vid,
-                            "type": version["type"],
-                            "url": version["url"],
-                            "release_time": version["releaseTime"],
-                        }
-                    )
-
-            return filtered
+        response = await self._client.get(self.manifest_url, timeout=30.0)
+        response.raise_for_status()
+        manifest = response.json()
+
+        # filter versions in range
+        filtered = []
+        for version in manifest["versions"]:
+            vid = version["id"]
+            if self._version_in_range(vid):
+                filtered.append(
+                    {
+                        "id": vid,
+                        "type": version["type"],
+                        "url": version["url"],
+                        "release_time": version["releaseTime"],
+                    }
+                )
+
+        return filtered
 
     async def download_version_json(self, version: Dict) -> Dict:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(version["url"], timeout=30.0)
-            response.raise_for_status()
-            return response.json()
+        response = await self._client.get(version["url"], timeout=30.0)
+        response.raise_for_status()
+        return response.json()
 
     async def download_version_jar(self, version_id: str, download_url: str) -> Path:
         version_dir = self.data_dir / version_id
@@ -64,22 +89,25 @@ class MinecraftVersionDownloader:
             return jar_path
 
         print(f"  Downloading JAR: {download_url}")
-        async with httpx.AsyncClient() as client:
-            async with client.stream("GET", download_url, timeout=300.0) as response:
-                response.raise_for_status()
+        async with self._client.stream("GET", download_url, timeout=300.0) as response:
+            response.raise_for_status()
 
-                total = int(response.headers.get("content-length", 0))
-                downloaded = 0
+            total = int(response.headers.get("content-length", 0))
+            downloaded = 0
+            last_print = 0
 
-                with open(jar_path, "wb") as f:
-                    async for chunk in response.aiter_bytes(chunk_size=8192):
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        if total > 0:
-                            progress = (downloaded / total) * 100
-                            print(f"\r  Progress: {progress:.1f}%", end="", flush=True)
+            with open(jar_path, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+                async for chunk in response.aiter_bytes(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+                    downloaded += len(chunk)
+                    if total > 0 and (
+                        downloaded - last_print >= PROGRESS_INTERVAL or downloaded == total
+                    ):
+                        last_print = downloaded
+                        progress = (downloaded / total) * 100
+                        print(f"\r  Progress: {progress:.1f}%", end="", flush=True)
 
-                print()  #
+            print()  #
 
         return jar_path
 
@@ -92,12 +120,11 @@ class MinecraftVersionDownloader:
             return mappings_path
 
         print(f"  Downloading mappings: {mappings_url}")
-        async with httpx.AsyncClient() as client:
-            response = await client.get(mappings_url, timeout=60.0)
-            response.raise_for_status()
+        response = await self._client.get(mappings_url, timeout=60.0)
+        response.raise_for_status()
 
-            with open(mappings_path, "wb") as f:
-                f.write(response.content)
+        with open(mappings_path, "wb") as f:
+            f.write(response.content)
 
         return mappings_path
 
@@ -125,13 +152,23 @@ class MinecraftVersionDownloader:
 
         print(f"Found {len(versions)} versions in range {self.min_version} to {self.max_version}")
 
+        semaphore = asyncio.Semaphore(self.concurrent_downloads)
+
+        async def download(version: Dict) -> tuple[Path, Path]:
+            async with semaphore:
+                return await self.download_version(version)
+
+        downloads = await asyncio.gather(
+            *(download(version) for version in versions), return_exceptions=True
+        )
+
         results = []
-        for version in versions:
-            try:
-                jar_path, mappings_path = await self.download_version(version)
-                results.append((version["id"], jar_path, mappings_path))
-            except Exception as e:
-                print(f"Failed to download {version['id']}: {e}")
+        for version, outcome in zip(versions, downloads):
+            if isinstance(outcome, BaseException):
+                print(f"Failed to download {version['id']}: {outcome}")
+                continue
+            jar_path, mappings_path = outcome
+            results.append((version["id"], jar_path, mappings_path))
 
         return results
 
@@ -142,7 +179,10 @@ async def main():
     data_dir = Path("./data/minecraft")
     downloader = MinecraftVersionDownloader(data_dir, min_version="1.20", max_version="1.20.1")
 
-    results = await downloader.download_all()
+    try:
+        results = await downloader.download_all()
+    finally:
+        await downloader.close()
     print(f"\nDownloaded {len(results)} versions")
 
 
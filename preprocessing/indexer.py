@@ -1,8 +1,12 @@
 import asyncio
+import multiprocessing
+import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
-from typing import List
+from typing import AsyncIterator, List, Tuple
 import aiofiles
 import asyncio
 
@@ -10,79 +14,191 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app.config import settings
 from app.services.database import db
+from app.services.file_service import file_service
 from app.services.search_service import search_service
 from app.models.schemas import VersionInfo
 
+# files read into memory per full-text index transaction
+SEARCH_INDEX_CHUNK_SIZE = 1000
+
+# metadata jobs per pool worker; a few per worker keeps the workers evenly loaded
+METADATA_CHUNKS_PER_WORKER = 4
+
+# seconds between progress lines
+PROGRESS_INTERVAL = 1.0
+
+
+def _scandir_recursive(root):
+    """Yield a DirEntry for every regular file under root, reusing scandir's cached stat."""
+    try:
+        it = os.scandir(root)
+    except OSError:
+        return
+    with it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _scandir_recursive(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+def _count_lines_sync(path: str) -> int:
+    count = 0
+    last = b""
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            count += chunk.count(b"\n")
+            last = chunk
+    # a final line without a trailing newline still counts, as it did with line iteration
+    if last and not last.endswith(b"\n"):
+        count += 1
+    return count
+
+
+def _process_chunk(
+    src_dir: str, files: List[Tuple[str, int]]
+) -> Tuple[List[dict], List[str]]:
+    """Return the chunk's metadata and an error message per file that could not be read."""
+    # scandir paths all start with src_dir, so the relative path is a slice, not a relpath()
+    prefix_len = len(os.path.join(src_dir, ""))
+    metadata = []
+    errors = []
+    for path, size in files:
+        try:
+            line_count = _count_lines_sync(path)
+        except OSError as exc:
+            # reported by the parent, which knows the version being indexed
+            errors.append(str(exc))
+            continue
+        metadata.append(
+            {
+                "path": path[prefix_len:].replace(os.sep, "/"),
+                "size_bytes": size,
+                "line_count": line_count,
+            }
+        )
+    return metadata, errors
+
+
 class VersionIndexer:
     def __init__(self):
         self.data_dir = settings.data_dir
+        # line counting is CPU and syscall bound, so it runs outside the GIL; workers come
+        # from a forkserver because forking after the database threads start is unsafe
+        self._process_pool = ProcessPoolExecutor(
+            max_workers=settings.threads, mp_context=multiprocessing.get_context("forkserver")
+        )
 
-    async def _count_lines(self, path: Path) -> int:
-        count = 0
-        async with aiofiles.open(path, "r", encoding="utf-8", errors="ignore") as f:
-            async for _ in f:
-                count += 1
-        return count
-
-    async def _gather_file_metadata(self, src_dir: Path) -> List[dict]:
-        java_files = list(src_dir.rglob("*.java"))
+    def close(self) -> None:
+        self._process_pool.shutdown()
+
+    async def _gather_file_metadata(
+        self, version_id: str, src_dir: Path
+    ) -> AsyncIterator[List[dict]]:
+        """Yield file metadata one worker chunk at a time, as the chunks complete."""
+        # (path, size) pairs; the size comes from the stat cached by scandir
+        java_files = [
+            (entry.path, entry.stat().st_size)
+            for entry in _scandir_recursive(src_dir)
+            if entry.name.endswith(".java")
+        ]
         total_files = len(java_files)
         if total_files == 0:
-            return []
+            return
 
         print(f"  Found {total_files} Java files")
-        semaphore = asyncio.Semaphore(settings.threads)
-        metadata: List[dict] = []
-
-        async def process(path: Path):
-            async with semaphore:
-                relative_path = path.relative_to(src_dir)
-                size = path.stat().st_size
-                line_count = await self._count_lines(path)
-
-                parts = str(relative_path).replace("\\", "/").split("/")
-                class_name = parts[-1].replace(".java", "") if parts else None
-                package = ".".join(parts[:-1]) if len(parts) > 1 else None
-
-                return {
-                    "path": str(relative_path),
-                    "size_bytes": size,
-                    "line_count": line_count,
-                    "class_name": class_name,
-                    "package": package,
-                }
-
-        tasks = [asyncio.create_task(process(path)) for path in java_files]
+
+        loop = asyncio.get_running_loop()
+        chunk_count = settings.threads * METADATA_CHUNKS_PER_WORKER
+        chunk_size = -(-total_files // chunk_count)
         completed = 0
-        for task in asyncio.as_completed(tasks):
+        last_print = 0.0
+
+        async def run(chunk: List[Tuple[str, int]]) -> List[dict]:
+            nonlocal completed, last_print
             try:
-                result = await task
-                if result:
-                    metadata.append(result)
+                chunk_metadata, errors = await loop.run_in_executor(
+                    self._process_pool, _process_chunk, str(src_dir), chunk
+                )
             except Exception as exc:
-                print(f"  Failed to process file: {exc}")
-            completed += 1
-            if completed % 200 == 0:
+                # a lost chunk would silently drop its files from the index
+                raise RuntimeError(
+                    f"Failed to process {len(chunk)} files for {version_id}: {exc}"
+                ) from exc
+            for error in errors:
+                print(f"  [{version_id}] Failed to process file: {error}")
+            completed += len(chunk)
+            now = time.monotonic()
+            if now - last_print >= PROGRESS_INTERVAL or completed == total_files:
+                last_print = now
                 print(f"  Processed {completed}/{total_files} files...", end="\r")
-
-        return metadata
-
-    async def index_version_files(self, version_id: str, src_dir: Path):
+            return chunk_metadata
+
+        chunks = [
+            java_files[start : start + chunk_size] for start in range(0, total_files, chunk_size)
+        ]
+        # all chunks are submitted up front; each is handed on as soon as its worker finishes
+        tasks = [asyncio.create_task(run(chunk)) for chunk in chunks]
+        try:
+            for next_chunk in asyncio.as_completed(tasks):
+                chunk_metadata = await next_chunk
+                if chunk_metadata:
+                    yield chunk_metadata
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def index_version_files(self, version_id: str, src_dir: Path) -> Tuple[List[str], int]:
+        """Index file metadata; return the indexed paths and their total size in bytes."""
         print(f"\nIndexing files for {version_id}...")
 
-        metadata = await self._gather_file_metadata(src_dir)
-        await db.add_files_bulk(version_id, metadata)
+        # each chunk is inserted while the remaining ones are still being counted
+        file_paths: List[str] = []
+        total_size = 0
+        async for chunk_metadata in self._gather_file_metadata(version_id, src_dir):
+            await db.add_files_bulk(version_id, chunk_metadata)
+            file_paths.extend(item["path"] for item in chunk_metadata)
+            total_size += sum(item["size_bytes"] for item in chunk_metadata)
+        await file_service.rebuild_file_tree(version_id)
 
-        print(f"  Indexed {len(metadata)} files for {version_id}")
-        return metadata
+        print(f"  Indexed {len(file_paths)} files for {version_id}")
+        return file_paths, total_size
 
-    async def index_version_search(self, version_id: str, file_metadata: List[dict]):
+    async def index_version_search(self, version_id: str, file_paths: List[str]):
         print(f"\nIndexing {version_id} for search...")
 
-        file_paths = sorted([item["path"] for item in file_metadata])
+        # the registry keeps paths in list_files order; sorted in place, no second list
+        file_paths.sort()
         await search_service.register_version(version_id, file_paths)
 
-        print(f"  Registered {len(file_paths)} files for search")
+        src_dir = self.data_dir / version_id / "src"
+
+        async def read_chunk(chunk: List[str]) -> List[Tuple[str, str]]:
+            # settings.threads workers share one iterator instead of a task per file
+            paths = iter(chunk)
+            documents: List[Tuple[str, str]] = []
+
+            async def worker():
+                for path in paths:
+                    try:
+                        async with aiofiles.open(src_dir / path, "r", encoding="utf-8") as f:
+                            documents.append((path, await f.read()))
+                    except (OSError, UnicodeDecodeError):
+                        continue
+
+            await asyncio.gather(*(worker() for _ in range(settings.threads)))
+            return documents
+
+        await db.clear_search_documents(version_id)
+        indexed = 0
+        for start in range(0, len(file_paths), SEARCH_INDEX_CHUNK_SIZE):
+            chunk = file_paths[start : start + SEARCH_INDEX_CHUNK_SIZE]
+            documents = await read_chunk(chunk)
+            await db.add_search_documents(version_id, documents)
+            indexed += len(documents)
+        await db.mark_search_indexed(version_id)
+
+        print(f"  Registered {len(file_paths)} files for search ({indexed} indexed)")
         return len(file_paths)
 
     async def update_version_metadata(
@@ -102,11 +218,7 @@ class VersionIndexer:
         print(f"  Updated metadata for {version_id}")
 
     def _calculate_directory_size(self, directory: Path) -> int:
-        total = 0
-        for file in directory.rglob("*"):
-            if file.is_file():
-                total += file.stat().st_size
-        return total
+        return sum(entry.stat().st_size for entry in _scandir_recursive(directory))
 
     async def index_version(
         self,
@@ -121,12 +233,22 @@ class VersionIndexer:
         print(f"Indexing {version_id}")
         print(f"{'=' * 60}")
 
-        file_metadata = await self.index_version_files(version_id, src_dir)
-        file_count = len(file_metadata)
+        # files reference the version row, so a placeholder must exist before ingest
+        await db.ensure_version(
+            VersionInfo(
+                id=version_id,
+                type=version_type,
+                url=url,
+                release_time=datetime.fromisoformat(release_time.replace("Z", "+00:00")),
+            )
+        )
+
+        file_paths, files_size = await self.index_version_files(version_id, src_dir)
+        file_count = len(file_paths)
 
-        await self.index_version_search(version_id, file_metadata)
+        await self.index_version_search(version_id, file_paths)
 
-        computed_size = size_bytes or sum(item["size_bytes"] for item in file_metadata)
+        computed_size = size_bytes or files_size
 
         await self.update_version_metadata(
             version_id, version_type, url, release_time, file_count, computed_size
@@ -156,35 +278,37 @@ class VersionIndexer:
 
 async def main():
 
-    await db.connect()
-    await db.init_schema()
-    await search_service.connect()
-    await search_service.init_index()
-
     indexer = VersionIndexer()
-
-    test_version = {
-        "id": "1.20.1",
-        "type": "release",
-        "url": "https://example.com/1.20.1.json",
-        "release_time": "2023-06-12T12:00:00Z",
-    }
-
-    src_dir = settings.data_dir / test_version["id"] / "src"
-    if src_dir.exists():
-        size_bytes = indexer._calculate_directory_size(src_dir)
-        await indexer.index_version(
-            test_version["id"],
-            test_version["type"],
-            test_version["url"],
-            test_version["release_time"],
-            src_dir,
-            size_bytes,
-        )
-    else:
-        print(f"Source directory not found: {src_dir}")
-
-    await db.disconnect()
+    # pooled connections hold non-daemon threads; always release them so errors can exit
+    try:
+        await db.connect()
+        await db.init_schema()
+        await search_service.connect()
+        await search_service.init_index()
+
+        test_version = {
+            "id": "1.20.1",
+            "type": "release",
+            "url": "https://example.com/1.20.1.json",
+            "release_time": "2023-06-12T12:00:00Z",
+        }
+
+        src_dir = settings.data_dir / test_version["id"] / "src"
+        if src_dir.exists():
+            size_bytes = indexer._calculate_directory_size(src_dir)
+            await indexer.index_version(
+                test_version["id"],
+                test_version["type"],
+                test_version["url"],
+                test_version["release_time"],
+                src_dir,
+                size_bytes,
+            )
+        else:
+            print(f"Source directory not found: {src_dir}")
+    finally:
+        indexer.close()
+        await db.disconnect()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file